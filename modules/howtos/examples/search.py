@@ -29,25 +29,42 @@ Here is a simple MatchQuery that looks for the text “swanky” using a defined
 from couchbase.cluster import Cluster, ClusterOptions, PasswordAuthenticator
 from couchbase.exceptions import CouchbaseException
 from couchbase.search import QueryStringQuery, SearchQuery, SearchOptions, PrefixQuery, HighlightStyle, SortField, \
-    SortScore, TermFacet
+    SortScore, SortID, TermFacet, NumericFacet, DateFacet
 from couchbase.mutation_state import MutationState
 
+from datetime import timedelta
+import functools
 import logging
 # end::imports[]
 
 
+# tag::cluster[]
+@functools.lru_cache(maxsize=1)
+def _cluster():
+    # connect once and share the Cluster: every search_query after the first
+    # reuses its cluster map, authenticated connections and pooled FTS sockets
+    return Cluster.connect("localhost", ClusterOptions(PasswordAuthenticator("Administrator", "password")))
+# end::cluster[]
+
+
 class Search:
 
     @staticmethod
     def __call__(*args: str):
-        cluster = Cluster.connect("localhost", ClusterOptions(PasswordAuthenticator("Administrator", "password")))
-        bucket = cluster.bucket("travel-sample")
-        collection = bucket.default_collection()
+        cluster = _cluster()
 
         """
 == Examples
 
-Search queries are executed at Cluster level (not bucket or collection).
+Search queries are executed at Cluster level (not bucket or collection), so from Couchbase Server 6.5 there is no need to open a bucket unless you also use the Key Value API (see the note on older clusters below).
+Connecting to the cluster fetches the cluster map, authenticates and sets up the connections used for search,
+so create the `Cluster` once and share it between all of your queries rather than connecting for each one:
+
+[source,python]
+----
+include::example$search.py[tag=cluster,indent=0]
+----
+
 Here is a simple MatchQuery that looks for the text “swanky” using a defined index:
 
 [source,python]
@@ -61,9 +78,9 @@ include::example$search.py[tag=simple,indent=0]
             result = cluster.search_query("index",
                                           QueryStringQuery("query"))
             for row in result.rows():
-                print("Found row {}".format(row)
-                print("Reported total rows: "
-                      + result.metadata().metrics().total_rows())
+                print("Found row {} with score {}".format(row.id, row.score))
+            print("Reported total rows: {}".format(
+                result.metadata().metrics().total_rows()))
         except CouchbaseException:
             logging.error(traceback.format_exc())
         # end::simple[]
@@ -144,16 +161,21 @@ Once the search query is executed successfully, the server starts sending back t
 [source,python]
 ----
 include::example$search.py[tag=squery,indent=0]
+----
+
+If you expect a large number of hits, consider the asyncio API described under <<asyncio and Twisted APIs>>,
+which lets you start working on the rows as they stream in.
+To keep the number of rows held in memory bounded, fetch them a page at a time with `limit` and `search_after` as shown under <<Limit and Skip>>.
 """
         #tag::squery[]
         result = cluster.search_query("my-index-name", PrefixQuery("airports-"), SearchOptions(fields=["field-1"]))
 
         for row in result.rows():
-            print("Score: {}".format(row.score()))
-            print("Document Id: {}".format(row.id()))
+            print("Score: {}".format(row.score))
+            print("Document Id: {}".format(row.id))
 
             # Also print fields that are included in the query
-            print(row.fields())
+            print(row.fields)
         #end::squery[]
         """
 === Limit and Skip
@@ -171,9 +193,93 @@ It is possible to limit the returned results to a maximum amount using the `limi
             SearchOptions(skip=3, limit=4)
         )
         #end::limit[]
+
+        #tag::searchafter[]
+        # keep relevance order, with the document ID as a tie-breaker
+        # so every hit has a unique and stable position
+        page_size = 50
+        sort = [SortScore(desc=True), SortID()]
+        result = cluster.search_query(
+            "index",
+            QueryStringQuery("query"),
+            SearchOptions(limit=page_size, sort=sort)
+        )
+        rows = list(result.rows())
+        while rows:
+            for row in rows:
+                print("Score: {}, Document Id: {}".format(row.score, row.id))
+
+            # a short page means there is nothing left to fetch
+            if len(rows) < page_size:
+                break
+
+            # continue after the sort values (score, id) of the last hit
+            # instead of skipping everything before it
+            first_id = rows[0].id
+            result = cluster.search_query(
+                "index",
+                QueryStringQuery("query"),
+                SearchOptions(limit=page_size, sort=sort, raw=dict(search_after=rows[-1].sort))
+            )
+            rows = list(result.rows())
+
+            # servers without search_after support ignore it and return the first page again
+            if rows and rows[0].id == first_id:
+                logging.warning("search_after was ignored by the server, stopping after a partial result")
+                break
+        #end::searchafter[]
+
+        #tag::bookmark[]
+        import base64
+        import json
+
+        def encode_bookmark(sort_values):
+            return base64.urlsafe_b64encode(json.dumps(sort_values).encode()).decode()
+
+        def decode_bookmark(bookmark):
+            return json.loads(base64.urlsafe_b64decode(bookmark.encode()))
+
+        def search_page(query, bookmark=None, page_size=50):
+            options = dict(limit=page_size, sort=[SortScore(desc=True), SortID()])
+            if bookmark:
+                options["raw"] = dict(search_after=decode_bookmark(bookmark))
+            rows = list(cluster.search_query("index", QueryStringQuery(query), SearchOptions(**options)).rows())
+
+            # a short page means there is nothing left to fetch
+            next_bookmark = encode_bookmark(rows[-1].sort) if len(rows) == page_size else None
+            return rows, next_bookmark
+
+        # the client sends back the bookmark it got with the previous page, if any
+        rows, next_bookmark = search_page("query", bookmark=None)
+        for row in rows:
+            print("Score: {}, Document Id: {}".format(row.score, row.id))
+        # ...and next_bookmark goes out with the page, e.g. in a "next page" link
+        #end::bookmark[]
         """
 ----
 
+The search engine still has to find and rank every skipped hit before it can return the page you asked for,
+so the cost of a query grows with `skip`.
+That is fine for the first few pages, but treat a `skip` above a few thousand as a bug.
+To page deeply through a result set, sort by score with the document ID as a tie-breaker, so that every hit has a unique position,
+and pass the sort values of the last hit on one page as `search_after` (through the `raw` escape hatch) when asking for the next.
+Leaving out the score and sorting by document ID alone also works, but then the hits come back in ID order rather than by relevance.
+`search_after` requires Couchbase Server 6.6.1 or later; older servers silently ignore it and keep returning the first page,
+which is why the loop below logs a warning and stops if it gets the same page back:
+
+[source,python]
+----
+include::example$search.py[tag=searchafter,indent=0]
+----
+
+Every page then costs the same, however deep into the results it is.
+If the position has to be handed to a client (for example, as a "next page" link), wrap the last sort values in an opaque bookmark that is returned with each page and decoded again when the client asks for the next one:
+
+[source,python]
+----
+include::example$search.py[tag=bookmark,indent=0]
+----
+
 === ScanConsistency and ConsistentWith
 
 By default, all search queries will return the data from whatever is in the index at the time of query.
@@ -189,19 +295,34 @@ FTS allows `RequestPlus` queries -- _Read-Your-Own_Writes (RYOW)_ consistency, e
 [source,python]
 ----
 include::example$search.py[tag=ryow,indent=0]
+----
+
+Waiting for the index is a trade of latency for freshness:
+the query is held until every index partition has caught up with the mutations in the `MutationState`, and while the cluster is busy with writes that can add hundreds of milliseconds.
+Keep the default, eventually consistent, behaviour for most searches and only ask for RYOW where the caller must see its own write, as in the `require_fresh` flag above.
+Setting a `timeout` as well makes sure a lagging index cannot hold up the caller indefinitely.
 """
         #tag::ryow[]
+        collection = cluster.bucket("travel-sample").default_collection()
         mutation_result = collection.upsert("key", {})
         mutation_state = MutationState().add_results(mutation_result)
 
-        search_result = cluster.search_query(
-            "index",
-            QueryStringQuery("query"),
-            SearchOptions().consistent_with(mutation_state))
+        def search(query, require_fresh=False):
+            # the timeout stops a lagging index from holding up the caller for too long
+            options = dict(timeout=timedelta(seconds=2))
+            if require_fresh:
+                # the query waits until the index has caught up with mutation_state,
+                # which can take hundreds of milliseconds while writes are heavy
+                options["consistent_with"] = mutation_state
+            return cluster.search_query("index", QueryStringQuery(query), SearchOptions(**options))
 
+        # most searches can use whatever is already indexed...
+        search_result = search("query")
+
+        # ...so only wait for the index where the caller must see its own write
+        search_result = search("query", require_fresh=True)
         #end::ryow[]
         """
-----
 
 === Highlight
 
@@ -241,8 +362,7 @@ include::example$search.py[tag=sort,indent=0]
         #end::sort[]
         """
 Facets are aggregate information collected on a result set and are useful when it comes to categorization of result data.
-The SDK allows you to provide many different facet configurations to the search engine, the following example shows how to create a facet based on a term.
-Other possible facets include numeric and date ranges.
+The SDK allows you to provide many different facet configurations to the search engine, the following example shows how to request term, numeric range and date range facets together.
 
 === Facets
 
@@ -251,13 +371,27 @@ Other possible facets include numeric and date ranges.
 include::example$search.py[tag=facets,indent=0]
 ----
 
+All of the facets are computed alongside the hits and come back in the same response,
+so pass every facet you need in one `facets` dict rather than issuing a separate search query for each one.
+
 """
         # tag::facets[]
+        # one request, N facets -- do not loop search_query per facet
+        price_ranges = NumericFacet("price", 3)
+        price_ranges.add_range("cheap", max=10)
+        price_ranges.add_range("moderate", min=10, max=50)
+        price_ranges.add_range("expensive", min=50)
+
+        date_buckets = DateFacet("created", 2)
+        date_buckets.add_range("older", end="2019-01-01T00:00:00")
+        date_buckets.add_range("recent", start="2019-01-01T00:00:00")
 
         result = cluster.search_query(
             "index",
             QueryStringQuery("query"),
-            SearchOptions(facets=dict(categories=TermFacet("category", 5)))
+            SearchOptions(facets=dict(categories=TermFacet("category", 5),
+                                      price_ranges=price_ranges,
+                                      date_buckets=date_buckets))
         )
         # end::facets[]
 
@@ -270,6 +404,10 @@ You can tell the search engine to include the full content of a certain number o
                                                                                                         ----
 include::example$search.py[tag=fields,indent=0]
 ----
+
+Only stored fields that you name in `fields` are returned, and the SDK has to decode every one of them for every hit,
+so the cost of a query grows with the size of the requested fields multiplied by the number of hits.
+Ask only for the fields you are going to read, and avoid `fields=["*"]`; if you only need the document ID and score, leave `fields` out altogether.
 """
         #tag::fields[]
         result = cluster.search_query(
@@ -279,17 +417,59 @@ include::example$search.py[tag=fields,indent=0]
           )
         #end::fields[]
 
-# TODO: document async APIs?
-# #tag::simplereactive[]
-#   Mono<ReactiveSearchResult> result = cluster
-#     .reactive()
-#     .searchQuery("index", SearchQuery.queryString("query"));
-#
-#   result
-#     .flatMapMany(ReactiveSearchResult::rows)
-#     .subscribe(row -> System.out.println("Found row: " + row));
-#   // #end::simplereactive[]
-# }
+        # tag::simplereactive[]
+        import asyncio
+        from acouchbase.cluster import Cluster as AsyncCluster
+
+        async def connect_async():
+            async_cluster = AsyncCluster("couchbase://localhost",
+                                         ClusterOptions(PasswordAuthenticator("Administrator", "password")))
+            # as with the other acouchbase examples, wait for a bucket to connect;
+            # this also satisfies servers older than 6.5, which need an open bucket
+            bucket = async_cluster.bucket("travel-sample")
+            await bucket.on_connect()
+            return async_cluster
+
+        async def simple_async(async_cluster):
+            # rows are handed to the loop as soon as the server sends them
+            async for row in async_cluster.search_query("index", QueryStringQuery("query")):
+                print("Found row {} with score {}".format(row.id, row.score))
+        # end::simplereactive[]
+
+        # tag::backpressure[]
+        async def process_row(row):
+            # must not block: anything slow belongs in an executor, e.g.
+            # await asyncio.get_event_loop().run_in_executor(None, blocking_fn, row)
+            print("Score: {}, Document Id: {}".format(row.score, row.id))
+
+        async def stream_rows(async_cluster, batch_size=10, batch_timeout=5):
+            result = async_cluster.search_query("my-index-name",
+                                                PrefixQuery("airports-"),
+                                                SearchOptions(fields=["field-1"]))
+
+            # at most batch_size rows are processed at once; the SDK keeps
+            # reading the response meanwhile, so this does not bound memory
+            batch = []
+            async for row in result:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    await asyncio.wait_for(asyncio.gather(*map(process_row, batch)), batch_timeout)
+                    batch = []
+            if batch:
+                await asyncio.wait_for(asyncio.gather(*map(process_row, batch)), batch_timeout)
+
+        async def main():
+            # connect once and share the cluster between all of the queries
+            async_cluster = await connect_async()
+            try:
+                await simple_async(async_cluster)
+                await stream_rows(async_cluster)
+            finally:
+                async_cluster.disconnect()
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(main())
+        # end::backpressure[]
 
         """
 == Working with Results
@@ -323,17 +503,17 @@ Iterating facets
         #end::simplefacetresult[]
 """
 ----
-The `SearchRow` contains the following methods:
+The `SearchRow` has the following attributes:
 
 .SearchRow
 [options="header"]
 |====
-| `index()` | The name of the FTS index that gave this result.
-                                                       | `id()` | The id of the matching document.
-                                                                                         | `score()` | The score of this hit.
-                                                                                                                         | `explanation()` | If enabled provides an explanation in JSON form.
-                                                                                                                                                                                        | `locations()` | The individual locations of the hits as `SearchRowLocations`.
-                                                                                                                                                                                                                                                  | `fragments()` | The fragments for each field that was requested as highlighted.
+| `index` | The name of the FTS index that gave this result.
+                                                       | `id` | The id of the matching document.
+                                                                                         | `score` | The score of this hit.
+                                                                                                                         | `explanation` | If enabled provides an explanation in JSON form.
+                                                                                                                                                                                        | `locations` | The individual locations of the hits as `SearchRowLocations`.
+                                                                                                                                                                                                                                                  | `fragments` | The fragments for each field that was requested as highlighted.
 | `fieldsAs(final Class<T> target)` | Access to the returned fields, decoded via a `Class` type.
 | `fieldsAs(final TypeRef<T> target)` | Access to the returned fields, decoded via a `TypeRef` type.
 |====
@@ -352,40 +532,36 @@ This in turn makes it possible to serialize rows into POJOs or other structures
 
 Please see the documentation on transcoding and serialization for more information.
 
-== Reactive And Async APIs
+== asyncio and Twisted APIs
 
-In addition to the blocking API on `Cluster`, the SDK provides reactive and async APIs on `ReactiveCluster` or `AsyncCluster` respectively.
-If you are in doubt of which API to use, we recommend looking at the reactive first:
-    it builds on top of reactor, a powerful library that allows you to compose reactive computations and deal with error handling and other related concerns (like retry) in an elegant manner.
-The async API on the other hand exposes a `CompletableFuture` and is more meant for lower level integration into other libraries or if you need the last drop of performance.
+In addition to the blocking API on `Cluster`, the SDK provides Twisted and asyncio APIs on `txcouchbase.cluster.TxCluster` or `acouchbase.cluster.Cluster` respectively.
+If you are in doubt of which API to use, we recommend looking at acouchbase first:
+it builds on top of asyncio, the de-facto async framework for Python 3.4+.
 
-There is another reason for using the reactive API here: streaming large results with backpressure from the application side.
-Both the blocking and async APIs have no means of signalling backpressure in a good way, so if you need it the reactive API is your best option.
-
-[TIP]
-.Advanced Reactive Concepts Ahead
-====
-Please see recent guides to reactive programming for more information on the basics -- this guide dives straight into their impact on querying search.
-====
+The Twisted API on the other hand exposes a `Deferred` object for use with Twisted-integrated code.
 
-A simple reactive query is similar to the blocking one:
+A simple asyncio query is similar to the blocking one:
 
-    [source,java]
-    ----
-    include::example$search.py[tag=simplereactive,indent=0]
+[source,python]
+----
+include::example$search.py[tag=simplereactive,indent=0]
 ----
 
-This search query will stream all rows as they become available form the server.
-    If you want to manually control the data flow (which is important if you are streaming a lot of rows which could cause a potential out of memory situation) you can do this by using explicit `request()` calls.
+This search query will stream all rows as they become available from the server.
+As with the blocking API, connect once and pass the same cluster to every query.
+If you want to control how much work is in flight at any one time, you can consume the rows in fixed-size batches.
 
-                                                                                                                                                                                                              [source,java]
-                                                                                                                                                                                                              ----
+[source,python]
+----
 include::example$search.py[tag=backpressure,indent=0]
 ----
 
-In this example we initially request a batch size of 10 rows (so streaming can begin).
-Then as each row gets streamed it is written to a `process()` method which does whatever it needs to do to process.
-    Then a counter is decremented, and once all of the 10 outstanding rows are processed another batch is loaded.
-    Please note that with reactive code, if your `process()` method equivalent is blocking, you *must* move it onto another scheduler so that the I/O threads are not stalled.
-We always recommend not blocking in the first place in reactive code.
+In this example we collect a batch of 10 rows from the stream.
+Each row in the batch is then handed to a `process_row()` coroutine which does whatever it needs to do to process.
+Once all of the 10 outstanding rows are processed the next batch is read, so no more than 10 rows are being processed at a time, and `asyncio.wait_for` stops a stalled batch from holding up the caller indefinitely.
+Note that this limits how many rows your code works on at once, not how many rows the SDK holds:
+the SDK keeps reading the response from the server and buffers the rows until you take them, so a slow consumer still ends up holding the whole result.
+If memory has to stay bounded, fetch the results a page at a time with `limit` and `search_after` as shown under <<Limit and Skip>>.
+Please note that with asyncio code, if your `process_row()` equivalent is blocking, you *must* move it onto an executor so that the event loop is not stalled.
+We always recommend not blocking in the first place in asyncio code.
 """